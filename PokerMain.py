@@ -1,13 +1,15 @@
 # Poker Coach Streamlit App with Full Game Logic and Strategy
 import streamlit as st
-from treys import Card, Evaluator, Deck
-import boto3
+from treys import Card
+import aioboto3
+import asyncio
 import os
 from dotenv import load_dotenv
-import json
-from typing import Optional, List
-import matplotlib.pyplot as plt
+import orjson
+from typing import Optional, List, Tuple
 import numpy as np
+from coach_cache import CoachCache
+from poker_utils import card_new, parse_hand, preflop_label, preflop_odds, simulate_odds
 
 # Load env vars
 load_dotenv("api-keys")
@@ -17,53 +19,106 @@ REGION_NAME = os.getenv("REGION_NAME")
 
 # AWS Bedrock client
 
-def get_bedrock_client(
-    runtime: Optional[bool] = True,
-    aws_access_key_id: Optional[str] = None,
-    aws_secret_access_key: Optional[str] = None,
+BEDROCK_CONCURRENCY = 4  # stays under the Bedrock per-model TPS limit
+
+# Cached so the session (credentials and loaded service models) survives reruns
+@st.cache_resource
+def get_bedrock_session(
     aws_session_token: Optional[str] = None
 ):
-    if runtime:
-        service_name = 'bedrock-runtime'
-    else:
-        service_name = 'bedrock'
-
-    bedrock_runtime = boto3.client(
-        service_name=service_name,
-        region_name=REGION_NAME, 
+    return aioboto3.Session(
         aws_access_key_id=ACCESS_KEY_ID,
         aws_secret_access_key=SECRET_ACCESS_KEY,
-        aws_session_token=aws_session_token  # Optional
+        aws_session_token=aws_session_token,  # Optional
+        region_name=REGION_NAME
     )
 
-    print("boto3 Bedrock client successfully created!")
-    print(bedrock_runtime._endpoint)
-    return bedrock_runtime
-
-bedrock = get_bedrock_client()
-
-def call_bedrock(prompt: str, model_id: str = "anthropic.claude-instant-v1", max_tokens: int = 400) -> str:
+async def stream_bedrock_async(client, semaphore: asyncio.Semaphore, prompt: str, slot, model_id: str = "us.anthropic.claude-3-5-haiku-20241022-v1:0", max_tokens: int = 400) -> str:
     payload = {
-        "prompt": f"\n\nHuman: {prompt}\n\nAssistant:",
-        "max_tokens_to_sample": max_tokens,
+        "anthropic_version": "bedrock-2023-05-31",
+        "messages": [{"role": "user", "content": prompt}],
+        "max_tokens": max_tokens,
         "temperature": 0.7,
         "top_k": 250,
-        "top_p": 0.999,
-        "stop_sequences": ["\n\nHuman:"]
+        "top_p": 0.999
     }
-    response = bedrock.invoke_model(
-        modelId=model_id,
-        body=json.dumps(payload).encode("utf-8"),
-        contentType="application/json",
-        accept="application/json",
-    )
-    result = json.loads(response["body"].read().decode("utf-8"))
-    return result.get("completion", "").strip()
-
+    text = ""
+    async with semaphore:
+        response = await client.invoke_model_with_response_stream(
+            modelId=model_id,
+            body=orjson.dumps(payload),
+            contentType="application/json",
+            accept="application/json",
+            performanceConfigLatency="optimized",
+        )
+        # Redraw the slot as each text delta arrives so the user reads from the first token
+        async for event in response["body"]:
+            chunk = orjson.loads(event["chunk"]["bytes"])
+            if chunk.get("type") == "content_block_delta":
+                text += chunk["delta"].get("text", "")
+                slot.info(text)
+    return text.strip()
+
+async def _stream_bedrock_all(prompts: List[str], slots: list) -> list:
+    semaphore = asyncio.Semaphore(BEDROCK_CONCURRENCY)
+    async with get_bedrock_session().client("bedrock-runtime") as client:
+        return await asyncio.gather(
+            *(stream_bedrock_async(client, semaphore, prompt, slot) for prompt, slot in zip(prompts, slots)),
+            return_exceptions=True
+        )
+
+def stream_bedrock_many(prompts: List[str], slots: list) -> list:
+    # Streams each completion into its slot; returns the full texts in prompt order, a failed call as its exception
+    return asyncio.run(_stream_bedrock_all(prompts, slots))
+
+# Coach prompts are queued while the page renders and sent to Bedrock together at the end of the run.
+# full_run is cleared once that happens, so stage fragments rerun on their own know to send theirs.
+coach_requests = []
+full_run = True
+
+def request_coaching(prompt: str, scope: str):
+    # scope holds every input that changes the advice (stage, cards, seat, table size, pot), so the
+    # semantic tier in CoachCache.get only absorbs differences in wording; see there
+    coach_requests.append((st.empty(), prompt, scope))
+
+@st.cache_resource
+def get_coach_cache():
+    return CoachCache()
+
+def flush_coaching():
+    if not coach_requests:
+        return
+    slots, prompts, scopes = zip(*coach_requests)
+    coach_requests.clear()
+    coach_cache = get_coach_cache()
+    explanations, embeddings = coach_cache.get(list(prompts), list(scopes))
+    misses = []
+    for i, (slot, explanation) in enumerate(zip(slots, explanations)):
+        if explanation is None:
+            misses.append(i)
+        else:
+            slot.info(explanation)
+    if misses:
+        streamed = stream_bedrock_many([prompts[i] for i in misses], [slots[i] for i in misses])
+        answered = []
+        for i, explanation in zip(misses, streamed):
+            if isinstance(explanation, Exception):
+                slots[i].error(f"Error: {explanation}")
+            else:
+                slots[i].info(explanation)
+                answered.append((i, explanation))
+        coach_cache.put(
+            [prompts[i] for i, _ in answered],
+            [scopes[i] for i, _ in answered],
+            [text for _, text in answered],
+            [embeddings.get(i) for i, _ in answered]
+        )
 
-# Game logic
+def flush_coaching_if_fragment():
+    # A fragment rerun never reaches the end of the script, so it sends its own prompts
+    if not full_run:
+        flush_coaching()
 
-evaluator = Evaluator()
 
 # State
 if "bankroll" not in st.session_state:
@@ -105,85 +160,24 @@ user_hand_input = st.text_input("Pre-flop Hand (e.g. 'Ah 10s' for Ace hearts and
 
 # --- Utility functions ---
 
-def parse_hand(text):
-    cards = text.strip().split()
-    normalized = []
-    used_cards = set()
-
-    for card in cards:
-        card = card.strip().lower()
-
-        if card.startswith("10") and len(card) == 3:
-            rank = 'T'
-            suit = card[2]
-        elif len(card) == 2:
-            rank = card[0].upper()
-            suit = card[1]
-        else:
-            raise ValueError(f"Card '{card}' must be 2 or 3 characters like 'Ah', '10s'.")
-
-        if rank not in "23456789TJQKA" or suit not in "shdc":
-            raise ValueError(f"Invalid card: '{card}'")
-
-        card_str = rank + suit
-        try:
-            parsed = Card.new(card_str)
-        except Exception:
-            raise ValueError(f"Card.new() failed to parse '{card_str}'")
-
-        # Confirm round-trip matches input
-        if Card.int_to_str(parsed).lower() != card_str.lower():
-            raise ValueError(f"Treys parsed '{card_str}' incorrectly (got '{Card.int_to_str(parsed)}')")
-
-        if parsed in used_cards:
-            raise ValueError(f"Duplicate card '{card_str}' entered.")
-
-        used_cards.add(parsed)
-        normalized.append(parsed)
-
-    return normalized
-
-def simulate_odds(user_hand, known_board, num_opponents, iterations=500):
-    win = tie = 0
-    for _ in range(iterations):
-        deck = Deck()
-        for card in user_hand + known_board:
-            try:
-                deck.cards.remove(card)
-            except ValueError:
-                continue  # or log a warning if needed
-        board = known_board + deck.draw(5 - len(known_board))
-        villains = [deck.draw(2) for _ in range(num_opponents)]
-        if any(len(v) < 2 for v in villains):
-            raise ValueError("Deck ran out of cards during simulation. Reduce the number of opponents or iterations.")
-        user_score = evaluator.evaluate(board, user_hand)
-        scores = [evaluator.evaluate(board, v) for v in villains]
-        all_scores = scores + [user_score]
-        if user_score == min(all_scores):
-            if all_scores.count(user_score) > 1:
-                tie += 1
-            else:
-                win += 1
-    return (win / iterations * 100, tie / iterations * 100)
+@st.cache_data(max_entries=256, show_spinner=False)
+def simulate_odds_cached(hand_fs: frozenset, board_fs: frozenset, num_opponents: int, iterations: int = 500) -> Tuple[float, float]:
+    # Seeded from the cards so a recomputed entry reproduces the same odds
+    seed = hash((hand_fs, board_fs)) & 0xFFFFFFFF
+    return simulate_odds(sorted(hand_fs), sorted(board_fs), num_opponents, iterations, seed)
 
 # --- Preflop ---
 
 def plot_ev_chart(win_pct):
-    ev_values = [((win_pct / 100) * pot - (1 - win_pct / 100) * pot / 2) for pot in range(10, 110, 10)]
-    plt.figure()
-    plt.plot(range(10, 110, 10), ev_values, marker='o')
-    plt.xlabel('Pot Size')
-    plt.ylabel('Expected Value ($)')
-    plt.title('Expected Value vs Pot Size')
-    st.pyplot(plt)
+    pots = np.arange(10, 110, 10)
+    ev_values = (win_pct / 100) * pots - (1 - win_pct / 100) * pots / 2
+    st.line_chart({"Pot Size": pots, "Expected Value ($)": ev_values}, x="Pot Size", y="Expected Value ($)")
 
 if user_hand_input:
     try:
-        user_hand = parse_hand(user_hand_input)
-        preflop_win_pct, tie_pct = simulate_odds(user_hand, [], num_players - 1)
-        dummy_board = Deck().draw(5)
-        hand_score = evaluator.evaluate(dummy_board, user_hand)
-        strength = evaluator.class_to_string(evaluator.get_rank_class(hand_score)) + f" (score: {hand_score})"
+        user_hand = list(parse_hand(user_hand_input))
+        preflop_win_pct, tie_pct = preflop_odds(user_hand, num_players - 1)
+        starting_hand = preflop_label(user_hand)
 
         # Improved decision logic based on EV thresholding and estimated fold equity
         pot_odds = 1 / (num_players + 1)
@@ -209,70 +203,92 @@ if user_hand_input:
         }
 
         prompt = f"You are a Game Theory Optimal (GTO) poker coach with deep knowledge of exploitative and optimal strategies. The user holds {user_hand_input} in {position} position at a {num_players}-handed table. The pre-flop win rate is {preflop_win_pct:.2f}%. Given this, provide a technically grounded recommendation to Raise, Call, Bluff, or Fold. Justify the action using GTO concepts such as hand range dominance, position equity, fold equity, and expected value (EV). Also evaluate if this is a good spot for a bluff based on the user's image and position."
-        explanation = call_bedrock(prompt)
-        st.write(f"Preflop Odds: {preflop_win_pct:.2f}%, Tie: {tie_pct:.2f}%, Strength: {strength}")
+        st.write(f"Preflop Odds: {preflop_win_pct:.2f}%, Tie: {tie_pct:.2f}%, Starting Hand: {starting_hand}")
 #        st.success(f"Coach Recommendation: {action}")
-        st.info(explanation)
+        request_coaching(prompt, f"preflop {user_hand_input} {position} {num_players}")
         plot_ev_chart(preflop_win_pct)
 
     except Exception as e:
         st.error(f"Error: {e}")
 
+# Each later stage is a fragment: its widgets (pot size, next card, result) rerun only that stage
+# instead of the whole hand. A new card still needs a full rerun, since the stages after it depend on it.
+# Each stage's pot goes into st.session_state.hand, so the next stage starts from the latest value
+# even when it was edited in a fragment rerun.
+
+def refresh_if_changed(key, value):
+    changed = st.session_state.hand.get(key) != value
+    st.session_state.hand[key] = value
+    if changed and not full_run:
+        st.rerun()
+
 # --- Flop ---
-if st.session_state.hand.get("stage") == "flop":
+@st.fragment
+def flop_block():
     st.subheader("🪙 Update Pot Size")
-    pot = st.number_input("Enter pot size after preflop:", min_value=0.0, step=10.0, value=pot)
+    pot = st.number_input("Enter pot size after preflop:", min_value=0.0, step=10.0, value=st.session_state.hand.get("pot", 0.0))
+    st.session_state.hand["flop_pot"] = pot
     flop_input = st.text_input("Enter Flop (e.g. '7d Jc 2h')")
+    refresh_if_changed("flop_input", flop_input)
     if flop_input:
         try:
-            board = parse_hand(flop_input)
-            st.session_state.hand["board"] = board
-            win_pct, tie_pct = simulate_odds(st.session_state.hand["user_hand"], board, num_players - 1)
+            board = list(parse_hand(flop_input))
+            st.session_state.hand["flop_board"] = board
+            win_pct, tie_pct = simulate_odds_cached(frozenset(st.session_state.hand["user_hand"]), frozenset(board), num_players - 1)
             st.write(f"Flop Win %: {win_pct:.2f}%")
 #           action = "Raise" if win_pct > 60 else ("Call" if win_pct > 30 else "Fold")
             prompt = f"User has {user_hand_input} in {position} position. Pot after flop is {pot} Flop is {flop_input}. Win chance: {win_pct:.2f}%. Pot: ${pot}. Provide a technically sound recommendation to Raise, Call, or Fold. Justify with concepts like range interaction, board texture, fold equity, and expected value. Is this a spot for semi-bluffing based on the board dynamics?"
             st.session_state.hand["stage"] = "turn"
 #            st.success(f"Coach Recommendation: {action}")
-            st.info(call_bedrock(prompt))
+            request_coaching(prompt, f"flop {user_hand_input} {flop_input} {position} {num_players} {pot}")
+            plot_ev_chart(win_pct)
         except Exception as e:
             st.error(f"Error: {e}")
-        plot_ev_chart(win_pct)
+    flush_coaching_if_fragment()
 
 # --- Turn ---
-if st.session_state.hand.get("stage") == "turn":
+@st.fragment
+def turn_block():
     st.subheader("🪙 Update Pot Size")
-    pot = st.number_input("Enter pot size after flop:", min_value=0.0, step=10.0, value=pot)
+    pot = st.number_input("Enter pot size after flop:", min_value=0.0, step=10.0, value=st.session_state.hand.get("flop_pot", 0.0))
+    st.session_state.hand["turn_pot"] = pot
     turn_card = st.text_input("Enter Turn (e.g. 'Qc')")
+    refresh_if_changed("turn_input", turn_card)
     if turn_card:
         try:
-            st.session_state.hand["board"].append(Card.new(turn_card))
-            win_pct, tie_pct = simulate_odds(st.session_state.hand["user_hand"], st.session_state.hand["board"], num_players - 1)
+            board = st.session_state.hand["flop_board"] + [card_new(turn_card)]
+            st.session_state.hand["turn_board"] = board
+            win_pct, tie_pct = simulate_odds_cached(frozenset(st.session_state.hand["user_hand"]), frozenset(board), num_players - 1)
             st.write(f"Turn Win %: {win_pct:.2f}%")
 #            action = "Raise" if win_pct > 70 else ("Call" if win_pct > 35 else "Fold")
-            board_str = ' '.join(Card.int_to_str(c) for c in st.session_state.hand['board'])
+            board_str = ' '.join(Card.int_to_str(c) for c in board)
             prompt = f"User has {user_hand_input} on turn. Board: {board_str}. Pot: ${pot}. Win %: {win_pct:.2f}%. Provide a detailed technical recommendation using hand strength vs range, pot odds, and bluff equity. Should the user semi-bluff or slowplay?"
             st.session_state.hand["stage"] = "river"
 #            st.success(f"Coach Recommendation: {action}")
-            st.info(call_bedrock(prompt))
+            request_coaching(prompt, f"turn {user_hand_input} {board_str} {num_players} {pot}")
+            plot_ev_chart(win_pct)
         except Exception as e:
             st.error(f"Error: {e}")
-        plot_ev_chart(win_pct)
+    flush_coaching_if_fragment()
 
 # --- River ---
-if st.session_state.hand.get("stage") == "river":
+@st.fragment
+def river_block():
     st.subheader("🪙 Update Pot Size")
-    pot = st.number_input("Enter pot size after turn:", min_value=0.0, step=10.0, value=pot)
+    pot = st.number_input("Enter pot size after turn:", min_value=0.0, step=10.0, value=st.session_state.hand.get("turn_pot", 0.0))
     river_card = st.text_input("Enter River (e.g. 'Th')")
+    refresh_if_changed("river_input", river_card)
     if river_card:
         try:
-            st.session_state.hand["board"].append(Card.new(river_card))
-            win_pct, tie_pct = simulate_odds(st.session_state.hand["user_hand"], st.session_state.hand["board"], num_players - 1)
-            final_board = ' '.join(Card.int_to_str(c) for c in st.session_state.hand["board"])
+            board = st.session_state.hand["turn_board"] + [card_new(river_card)]
+            st.session_state.hand["board"] = board
+            win_pct, tie_pct = simulate_odds_cached(frozenset(st.session_state.hand["user_hand"]), frozenset(board), num_players - 1)
+            final_board = ' '.join(Card.int_to_str(c) for c in board)
             st.write(f"River Win %: {win_pct:.2f}%")
 #            action = "All-in" if win_pct > 85 else ("Raise" if win_pct > 60 else ("Bluff" if win_pct < 20 else "Check/Fold"))
             prompt = f"User's hand: {user_hand_input}. Final board: {final_board}. Final pot size is {pot}. Win %: {win_pct:.2f}%. Pot: ${pot}. Provide a technical recommendation for post-river play. Consider opponent ranges, bet sizing, bluff catching, and whether this is a profitable bluff spot. Justify using GTO principles and EV calculations."
 #            st.success(f"Coach Recommendation: {action}")
-            st.info(call_bedrock(prompt))
+            request_coaching(prompt, f"river {user_hand_input} {final_board} {num_players} {pot}")
             plot_ev_chart(win_pct)
             
             outcome = st.radio("Did you win the hand?", ["Won", "Lost", "Folded"])
@@ -294,3 +310,17 @@ if st.session_state.hand.get("stage") == "river":
 
         except Exception as e:
             st.error(f"Error: {e}")
+    flush_coaching_if_fragment()
+
+# --- Coach ---
+# Queued advice is sent even if a stage raises, so earlier stages keep theirs
+try:
+    if st.session_state.hand.get("stage") == "flop":
+        flop_block()
+    if st.session_state.hand.get("stage") == "turn":
+        turn_block()
+    if st.session_state.hand.get("stage") == "river":
+        river_block()
+finally:
+    flush_coaching()
+    full_run = False
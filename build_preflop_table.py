@@ -0,0 +1,29 @@
+# Precomputes preflop_equity.npy: win/tie % for each of the 169 starting-hand classes vs 1..9 opponents
+# Run offline with `python build_preflop_table.py`; the app only loads the result
+import numpy as np
+from treys import Card
+
+from poker_utils import canonicalize, preflop_equity_path, simulate_odds
+
+ITERATIONS = 100_000
+MAX_OPPONENTS = 9
+
+def representative_hand(index):
+    # Inverse of canonicalize: any hand from the class gives the same equity
+    row, col = divmod(index, 13)
+    if row < col:
+        return [Card.new(Card.STR_RANKS[col] + "s"), Card.new(Card.STR_RANKS[row] + "s")]
+    return [Card.new(Card.STR_RANKS[row] + "s"), Card.new(Card.STR_RANKS[col] + "h")]
+
+def build_table(iterations=ITERATIONS):
+    table = np.zeros((169, MAX_OPPONENTS, 2), dtype=np.float32)
+    for index in range(169):
+        hand = representative_hand(index)
+        assert canonicalize(hand) == index
+        for num_opponents in range(1, MAX_OPPONENTS + 1):
+            table[index, num_opponents - 1] = simulate_odds(hand, [], num_opponents, iterations, seed=index * 16 + num_opponents)
+        print(f"{Card.ints_to_pretty_str(hand)} done")
+    return table
+
+if __name__ == "__main__":
+    np.save(preflop_equity_path(), build_table())
@@ -0,0 +1,93 @@
+# On-disk cache for coach completions: exact prompt hash first, then embedding similarity
+import hashlib
+import logging
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+SIMILARITY_THRESHOLD = 0.95
+
+logger = logging.getLogger(__name__)
+
+
+class CoachCache:
+    def __init__(self, path: str = "coach_cache.sqlite3", threshold: float = SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        # One instance is shared by every session thread (st.cache_resource), so the connection and
+        # the lazy model load are serialized by this lock
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            "prompt_hash TEXT PRIMARY KEY, scope TEXT NOT NULL, "
+            "embedding BLOB NOT NULL, completion TEXT NOT NULL)"
+        )
+        self._model = None
+
+    def _embed(self, prompts: List[str]) -> np.ndarray:
+        if self._model is None:
+            # Loaded on first miss so a fully cached session never imports torch
+            from sentence_transformers import SentenceTransformer
+            self._model = SentenceTransformer(EMBEDDING_MODEL)
+        return self._model.encode(prompts, normalize_embeddings=True).astype(np.float32)
+
+    @staticmethod
+    def _hash(prompt: str) -> str:
+        return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+    def get(self, prompts: List[str], scopes: List[str]) -> Tuple[List[Optional[str]], Dict[int, np.ndarray]]:
+        # Semantic matches are only taken from entries with the same scope (every input the advice
+        # depends on), so a near-identical prompt about a different spot is never reused.
+        # Also returns the embedding of each prompt that missed the exact tier, keyed by index, for put.
+        # If the embedding model can't load or run, those prompts are plain misses
+        with self._lock:
+            results = []
+            misses = []
+            embeddings = {}
+            for i, prompt in enumerate(prompts):
+                row = self.conn.execute(
+                    "SELECT completion FROM completions WHERE prompt_hash = ?", (self._hash(prompt),)
+                ).fetchone()
+                results.append(row[0] if row else None)
+                if row is None:
+                    misses.append(i)
+
+            if misses:
+                try:
+                    queries = self._embed([prompts[i] for i in misses])
+                except Exception:
+                    # e.g. torch missing or the model download failing offline; the exact tier still works
+                    logger.exception("Coach cache embedding failed; skipping the semantic lookup")
+                    queries = []
+                for i, query in zip(misses, queries):
+                    embeddings[i] = query
+                    rows = self.conn.execute(
+                        "SELECT embedding, completion FROM completions WHERE scope = ? AND length(embedding) > 0",
+                        (scopes[i],)
+                    ).fetchall()
+                    if not rows:
+                        continue
+                    mat = np.stack([np.frombuffer(emb, dtype=np.float32) for emb, _ in rows])
+                    sims = np.dot(query, mat.T)
+                    best = int(np.argmax(sims))
+                    if sims[best] > self.threshold:
+                        results[i] = rows[best][1]
+            return results, embeddings
+
+    def put(self, prompts: List[str], scopes: List[str], completions: List[str], embeddings: List[Optional[np.ndarray]]):
+        # embeddings are the ones get returned for these prompts, so the model isn't run twice.
+        # A prompt without one is stored for the exact tier only
+        if not prompts:
+            return
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?)",
+                [
+                    (self._hash(prompt), scope, emb.tobytes() if emb is not None else b"", completion)
+                    for prompt, scope, emb, completion in zip(prompts, scopes, embeddings, completions)
+                ]
+            )
+            self.conn.commit()
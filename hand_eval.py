@@ -0,0 +1,188 @@
+# Numba-compiled 7-card hand evaluator built on the treys lookup tables
+from itertools import combinations
+
+import numpy as np
+from numba import njit
+from treys import Card
+from treys.lookup import LookupTable
+
+# Treys card layout: xxxbbbbb bbbbbbbb cdhsrrrr xxpppppp (rank bits, suit bits, rank, rank prime).
+# Each card carries its own rank prime, so the kernels read it with a mask instead of a lookup.
+PRIME_MASK = 0x3F
+SUIT_MASK = 0xF000
+RANKBITS_SHIFT = 16
+
+# Lookup tables
+
+def _build_tables():
+    table = LookupTable()
+
+    # Flushes are keyed directly by the 13-bit rank mask of the five cards
+    flush_ranks = np.zeros(1 << 13, dtype=np.int32)
+    for ranks in combinations(range(13), 5):
+        rankbits = sum(1 << r for r in ranks)
+        flush_ranks[rankbits] = table.flush_lookup[Card.prime_product_from_rankbits(rankbits)]
+
+    # Everything else is keyed by the prime product; sorted for binary search
+    keys = np.array(sorted(table.unsuited_lookup), dtype=np.int64)
+    values = np.array([table.unsuited_lookup[k] for k in keys.tolist()], dtype=np.int32)
+    return flush_ranks, keys, values
+
+FLUSH_RANKS, UNSUITED_KEYS, UNSUITED_RANKS = _build_tables()
+
+# Treys card ints by deck index (rank * 4 + suit, suits in "shdc" order)
+IDX_TO_TREYS = np.array([Card.new(r + s) for r in Card.STR_RANKS for s in "shdc"], dtype=np.int32)
+
+# Scores run from 1 (royal flush) to MAX_HIGH_CARD; this is worse than any real hand
+WORST_SCORE = LookupTable.MAX_HIGH_CARD + 1
+
+# The 21 five-card subsets of a seven-card hand
+COMBOS_7 = np.array(list(combinations(range(7), 5)), dtype=np.int64)
+
+# Board subsets that pair with one or both hole cards to make five cards
+BOARD_4 = np.array(list(combinations(range(5), 4)), dtype=np.int64)
+BOARD_3 = np.array(list(combinations(range(5), 3)), dtype=np.int64)
+
+# Dealing
+
+@njit(cache=True)
+def deal_batch(avail, uniforms):
+    # One partial Fisher-Yates shuffle per row: uniforms (n, needed) in [0, 1) pick each
+    # dealt card from those not yet dealt, so only the cards actually needed are drawn
+    n, needed = uniforms.shape
+    m = avail.size
+    dealt = np.empty((n, needed), dtype=np.int32)
+    for i in range(n):
+        deck = avail.copy()
+        for j in range(needed):
+            k = min(j + int(uniforms[i, j] * (m - j)), m - 1)
+            deck[j], deck[k] = deck[k], deck[j]
+            dealt[i, j] = deck[j]
+    return dealt
+
+# Evaluation kernels
+
+@njit(cache=True)
+def eval5(c1, c2, c3, c4, c5):
+    if c1 & c2 & c3 & c4 & c5 & SUIT_MASK:
+        return FLUSH_RANKS[(c1 | c2 | c3 | c4 | c5) >> RANKBITS_SHIFT]
+    prime = np.int64(c1 & PRIME_MASK) * (c2 & PRIME_MASK) * (c3 & PRIME_MASK) * (c4 & PRIME_MASK) * (c5 & PRIME_MASK)
+    return UNSUITED_RANKS[np.searchsorted(UNSUITED_KEYS, prime)]
+
+
+@njit(cache=True)
+def eval7(cards):
+    best = WORST_SCORE
+    for i in range(COMBOS_7.shape[0]):
+        c = COMBOS_7[i]
+        score = eval5(cards[c[0]], cards[c[1]], cards[c[2]], cards[c[3]], cards[c[4]])
+        if score < best:
+            best = score
+    return best
+
+
+@njit(cache=True)
+def _subset_rank(prime, and_bits, or_bits):
+    # and_bits keeps a suit bit only if every card shares it; or_bits carries the rank mask
+    if and_bits & SUIT_MASK:
+        return FLUSH_RANKS[or_bits >> RANKBITS_SHIFT]
+    return UNSUITED_RANKS[np.searchsorted(UNSUITED_KEYS, prime)]
+
+
+@njit(cache=True)
+def _subset_context(board, subsets):
+    # (prime product, AND, OR) of each board subset; shared by every player in the deal
+    ctx = np.empty((subsets.shape[0], 3), dtype=np.int64)
+    for k in range(subsets.shape[0]):
+        prime, and_bits, or_bits = np.int64(1), np.int64(-1), np.int64(0)
+        for j in subsets[k]:
+            prime *= board[j] & PRIME_MASK
+            and_bits &= board[j]
+            or_bits |= board[j]
+        ctx[k, 0], ctx[k, 1], ctx[k, 2] = prime, and_bits, or_bits
+    return ctx
+
+
+@njit(cache=True)
+def board_context(board):
+    # Everything about a 5-card board that doesn't depend on the hole cards
+    return (
+        _subset_context(board, BOARD_4),
+        _subset_context(board, BOARD_3),
+        eval5(board[0], board[1], board[2], board[3], board[4]),
+    )
+
+
+@njit(cache=True)
+def eval_hole(ctx4, ctx3, board_score, h1, h2):
+    # Same result as eval7(board + [h1, h2]), reusing the precomputed board subsets
+    best = board_score
+    p1, p2 = h1 & PRIME_MASK, h2 & PRIME_MASK
+    for k in range(ctx4.shape[0]):
+        score = _subset_rank(ctx4[k, 0] * p1, ctx4[k, 1] & h1, ctx4[k, 2] | h1)
+        if score < best:
+            best = score
+        score = _subset_rank(ctx4[k, 0] * p2, ctx4[k, 1] & h2, ctx4[k, 2] | h2)
+        if score < best:
+            best = score
+    for k in range(ctx3.shape[0]):
+        score = _subset_rank(ctx3[k, 0] * p1 * p2, ctx3[k, 1] & h1 & h2, ctx3[k, 2] | h1 | h2)
+        if score < best:
+            best = score
+    return best
+
+
+@njit(cache=True)
+def showdown_batch(boards, user_hand, villains):
+    # boards: (n, 5), user_hand: (2,), villains: (n, opponents, 2) -> (wins, ties) over the n deals
+    n, opponents = villains.shape[0], villains.shape[1]
+    wins = 0
+    ties = 0
+    for i in range(n):
+        ctx4, ctx3, board_score = board_context(boards[i])
+        user_score = eval_hole(ctx4, ctx3, board_score, user_hand[0], user_hand[1])
+
+        # Single pass over the villains, tracking only the best score so far (lower is better)
+        best_villain = WORST_SCORE
+        for p in range(opponents):
+            score = eval_hole(ctx4, ctx3, board_score, villains[i, p, 0], villains[i, p, 1])
+            if score < best_villain:
+                best_villain = score
+                if score < user_score:
+                    break  # hand already lost; the rest can't change the outcome
+        if user_score < best_villain:
+            wins += 1
+        elif user_score == best_villain:
+            ties += 1
+    return wins, ties
+
+
+@njit(cache=True)
+def heads_up_exact(known_board, user_hand, avail):
+    # Every remaining runout and villain hand for one opponent once the board has 4 or 5 cards
+    # -> (wins, ties, deals); small enough to enumerate instead of sample
+    board = np.empty(5, dtype=np.int32)
+    board[:known_board.size] = known_board
+    m = avail.size
+    runouts = m if known_board.size == 4 else 1
+    wins = 0
+    ties = 0
+    deals = 0
+    for r in range(runouts):
+        if known_board.size == 4:
+            board[4] = avail[r]
+        ctx4, ctx3, board_score = board_context(board)
+        user_score = eval_hole(ctx4, ctx3, board_score, user_hand[0], user_hand[1])
+        for a in range(m):
+            if runouts > 1 and a == r:
+                continue
+            for b in range(a + 1, m):
+                if runouts > 1 and b == r:
+                    continue
+                score = eval_hole(ctx4, ctx3, board_score, avail[a], avail[b])
+                deals += 1
+                if user_score < score:
+                    wins += 1
+                elif user_score == score:
+                    ties += 1
+    return wins, ties, deals
@@ -0,0 +1,120 @@
+# Card parsing and odds helpers shared by the Streamlit app and build_preflop_table.py
+# Cached here rather than in PokerMain.py, which Streamlit re-executes (and so re-defines) on every rerun
+import os
+import sys
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from treys import Card
+
+from hand_eval import IDX_TO_TREYS, deal_batch, heads_up_exact, showdown_batch
+
+# Shared by every unseeded simulation so reruns keep drawing from one stream
+_RNG = np.random.default_rng(0xC0FFEE)
+SUIT_INDEX = {1: 0, 2: 1, 4: 2, 8: 3}  # treys suit bit -> position in "shdc"
+PAIR_NAMES = ("Twos", "Threes", "Fours", "Fives", "Sixes", "Sevens", "Eights", "Nines", "Tens", "Jacks", "Queens", "Kings", "Aces")
+
+@lru_cache(maxsize=52)
+def card_new(card_str: str) -> int:
+    return Card.new(card_str)
+
+@lru_cache(maxsize=2048)
+def parse_hand(text: str) -> Tuple[int, ...]:
+    cards = text.strip().split()
+    normalized: List[int] = []
+    used_mask = 0  # bit card_index(c) set once c has been seen
+
+    for card in cards:
+        card = card.strip().lower()
+
+        if card.startswith("10") and len(card) == 3:
+            rank = 'T'
+            suit = card[2]
+        elif len(card) == 2:
+            rank = card[0].upper()
+            suit = card[1]
+        else:
+            raise ValueError(f"Card '{card}' must be 2 or 3 characters like 'Ah', '10s'.")
+
+        if rank not in "23456789TJQKA" or suit not in "shdc":
+            raise ValueError(f"Invalid card: '{card}'")
+
+        card_str = rank + suit
+        try:
+            parsed = card_new(card_str)
+        except Exception:
+            raise ValueError(f"Card.new() failed to parse '{card_str}'")
+
+        # Confirm round-trip matches input
+        if Card.int_to_str(parsed).lower() != card_str.lower():
+            raise ValueError(f"Treys parsed '{card_str}' incorrectly (got '{Card.int_to_str(parsed)}')")
+
+        bit = 1 << card_index(parsed)
+        if used_mask & bit:
+            raise ValueError(f"Duplicate card '{card_str}' entered.")
+
+        used_mask |= bit
+        normalized.append(parsed)
+
+    return tuple(normalized)
+
+def canonicalize(hand: Sequence[int]) -> int:
+    # 13x13 starting-hand grid: pairs on the diagonal, suited above it, offsuit below
+    r1, r2 = sorted((Card.get_rank_int(c) for c in hand), reverse=True)
+    if Card.get_suit_int(hand[0]) == Card.get_suit_int(hand[1]):
+        return r2 * 13 + r1
+    return r1 * 13 + r2
+
+def card_index(card: int) -> int:
+    # Position of a treys card in IDX_TO_TREYS
+    return Card.get_rank_int(card) * 4 + SUIT_INDEX[Card.get_suit_int(card)]
+
+def preflop_label(hand: Sequence[int]) -> str:
+    # Starting-hand class from the two hole cards alone, e.g. "Pocket Aces", "AKs", "T9o"
+    r1, r2 = sorted((Card.get_rank_int(c) for c in hand), reverse=True)
+    if r1 == r2:
+        return f"Pocket {PAIR_NAMES[r1]}"
+    suited = Card.get_suit_int(hand[0]) == Card.get_suit_int(hand[1])
+    return f"{Card.STR_RANKS[r1]}{Card.STR_RANKS[r2]}{'s' if suited else 'o'}"
+
+def preflop_equity_path() -> str:
+    # Win/tie % for each of the 169 starting-hand classes against 1..9 opponents, from build_preflop_table.py.
+    # Resolved at call time: a mypyc-compiled module has no __file__ while it is being imported.
+    return os.path.join(os.path.dirname(os.path.abspath(sys.modules[__name__].__file__ or "")), "preflop_equity.npy")
+
+@lru_cache(maxsize=1)
+def _preflop_equity() -> np.ndarray:
+    return np.load(preflop_equity_path())
+
+def preflop_odds(hand: Sequence[int], num_opponents: int) -> Tuple[float, float]:
+    win, tie = _preflop_equity()[canonicalize(hand), num_opponents - 1]
+    return (float(win), float(tie))
+
+def simulate_odds(user_hand: List[int], known_board: List[int], num_opponents: int, iterations: int = 500, seed: Optional[int] = None) -> Tuple[float, float]:
+    # Deal every iteration at once: each row draws only the cards it needs from the unseen ones
+    to_deal = 5 - len(known_board)
+    needed = to_deal + 2 * num_opponents
+    used = np.zeros(52, dtype=np.bool_)
+    used[[card_index(c) for c in user_hand + known_board]] = True
+    avail = IDX_TO_TREYS[np.flatnonzero(~used)]
+    if needed > avail.size:
+        raise ValueError("Deck ran out of cards during simulation. Reduce the number of opponents or iterations.")
+
+    # Heads-up from the turn on there are at most ~40k deals: count them exactly rather than sample
+    if num_opponents == 1 and len(known_board) >= 4:
+        win, tie, deals = heads_up_exact(
+            np.array(known_board, dtype=np.int32), np.array(user_hand, dtype=np.int32), avail
+        )
+        return (win / deals * 100, tie / deals * 100)
+
+    rng = _RNG if seed is None else np.random.default_rng(seed)
+    dealt = deal_batch(avail, rng.random((iterations, needed)))
+
+    boards = np.empty((iterations, 5), dtype=np.int32)
+    boards[:, :len(known_board)] = known_board
+    boards[:, len(known_board):] = dealt[:, :to_deal]
+    villains = dealt[:, to_deal:].reshape(iterations, num_opponents, 2)
+
+    win, tie = showdown_batch(boards, np.array(user_hand, dtype=np.int32), villains)
+    return (win / iterations * 100, tie / iterations * 100)